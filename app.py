@@ -1,19 +1,59 @@
 """Personal Finance Assistant - No Upload Version"""
 
 import streamlit as st
-import pandas as pd
-from datetime import datetime
 import os
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
-import base64
+import re
+import json
 import random
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-from src.gemini_client import GeminiClient
-from src.knowledge_base_simple import SimpleKnowledgeBase
-from src.utils import validate_finance_question, process_document
+from src.knowledge_base_simple import get_simple_knowledge_base, search_knowledge_base
+from src.semantic_cache import get_semantic_cache
+from src.utils import normalize_question, validate_finance_question, process_document_cached
 from config.settings import get_settings
 
+DOCUMENTS_FOLDER = Path("data/documents")
+# Records the documents folder state from the last completed load so unchanged folders are not rescanned
+INGEST_STATE_PATH = Path("data/.ingest_state.json")
+
+# Comprehensive list of finance questions covering various topics
+SAMPLE_QUESTIONS = (
+    "What's the 50/30/20 budgeting rule?",
+    "How do I start an emergency fund?",
+    "What's the difference between 401k and IRA?",
+    "Should I pay off debt or invest first?",
+    "How much house can I afford?",
+    "What is compound interest and how does it work?",
+    "How do I improve my credit score?",
+    "What's the difference between stocks and bonds?",
+    "How much should I save for retirement?",
+    "What is dollar-cost averaging?",
+    "Should I get a financial advisor?",
+    "How do I create a budget from scratch?",
+    "What's the difference between Roth and traditional IRA?",
+    "How do I negotiate my salary?",
+    "What insurance do I really need?",
+    "How do I start investing with little money?",
+    "What's the avalanche vs snowball debt method?",
+    "How do I save money on groceries?",
+    "What are index funds and ETFs?",
+    "How do I plan for major expenses?",
+    "What's the difference between debit and credit cards?",
+    "How do I protect myself from identity theft?",
+    "What are the tax benefits of homeownership?",
+    "How do I choose a bank or credit union?",
+    "What's a good debt-to-income ratio?",
+    "How do I save for my child's education?",
+    "What are the basics of estate planning?",
+    "How do I manage money as a couple?",
+    "What's the difference between gross and net income?",
+    "How do I prepare for financial emergencies?"
+)
+
 # Page configuration
 st.set_page_config(
     page_title="Personal Finance Q&A Assistant",
@@ -149,26 +189,112 @@ st.markdown("""
             padding-right: 2rem;
         }
     }
+    
+    /* Submit button - fixed size and centered */
+    .stButton > button[kind="primary"],
+    .stFormSubmitButton > button {
+        width: 300px !important;
+        height: 70px !important;
+        font-size: 22px !important;
+        font-weight: 800 !important;
+        border-radius: 8px !important;
+        background-color: #ff4b4b !important;
+        border-color: #ff4b4b !important;
+    }
+    .stButton > button[kind="primary"]:hover,
+    .stFormSubmitButton > button:hover {
+        background-color: #ff6b6b !important;
+        border-color: #ff6b6b !important;
+    }
+    .main-button-container {
+        display: flex;
+        justify-content: center;
+        align-items: center;
+        margin: 30px 0;
+        width: 100%;
+    }
+    
+    /* Consistent styling for the expert answer */
+    .expert-answer {
+        font-family: 'Source Sans Pro', sans-serif;
+        font-size: 16px !important;
+        line-height: 1.6;
+        color: #262730;
+        background-color: #ffffff;
+        padding: 20px;
+        border-radius: 8px;
+        border: 1px solid #e6e6e6;
+    }
+    .expert-answer p {
+        font-size: 16px !important;
+        margin: 16px 0 !important;
+        font-weight: 400 !important;
+    }
+    .expert-answer strong, .expert-answer b {
+        font-weight: 600 !important;
+        font-size: 16px !important;
+    }
+    .expert-answer em, .expert-answer i {
+        font-style: italic !important;
+        font-size: 16px !important;
+        font-weight: 400 !important;
+    }
+    .expert-answer ul, .expert-answer ol {
+        margin: 16px 0 !important;
+        padding-left: 20px !important;
+    }
+    .expert-answer li {
+        font-size: 16px !important;
+        margin: 6px 0 !important;
+        font-weight: 400 !important;
+        line-height: 1.5;
+    }
+    /* Make subheaders visually distinct but proportional */
+    .expert-answer h1 {
+        font-size: 20px !important;
+        font-weight: 700 !important;
+        margin: 24px 0 12px 0 !important;
+        color: #1e3a8a !important;
+        border-bottom: 2px solid #e6e6e6 !important;
+        padding-bottom: 8px !important;
+    }
+    .expert-answer h2 {
+        font-size: 18px !important;
+        font-weight: 600 !important;
+        margin: 20px 0 10px 0 !important;
+        color: #1e40af !important;
+    }
+    .expert-answer h3 {
+        font-size: 16px !important;
+        font-weight: 600 !important;
+        margin: 16px 0 8px 0 !important;
+        color: #3b82f6 !important;
+    }
+    .expert-answer h4, .expert-answer h5, .expert-answer h6 {
+        font-size: 16px !important;
+        font-weight: 600 !important;
+        margin: 16px 0 8px 0 !important;
+        color: #64748b !important;
+    }
 </style>
 """, unsafe_allow_html=True)
 
 def initialize_app():
     """Initialize the application with settings and clients."""
     try:
-        settings = get_settings()
+        # Imported here so the header renders before the Gemini SDK (gRPC, protobuf) is loaded
+        from src.gemini_client import get_gemini_client
         
-        # Initialize Gemini client
-        if 'gemini_client' not in st.session_state:
-            st.session_state.gemini_client = GeminiClient(settings.GEMINI_API_KEY)
-        
-        # Initialize knowledge base
-        if 'knowledge_base' not in st.session_state:
-            st.session_state.knowledge_base = SimpleKnowledgeBase(settings.KNOWLEDGE_BASE_PATH)
+        # Gemini client and knowledge base are cached resources shared across reruns and sessions
+        get_gemini_client()
+        get_simple_knowledge_base()
             
-        # Auto-load documents from the documents folder
-        if 'documents_loaded' not in st.session_state:
-            load_predefined_documents()
-            st.session_state.documents_loaded = True
+        # Auto-load documents from the documents folder without blocking the first render
+        start_document_loading()
+        
+        # Optionally precompute answers for the example questions
+        if get_settings().WARM_SAMPLE_QUESTIONS:
+            start_sample_question_warmup()
             
         return True
         
@@ -186,182 +312,290 @@ def initialize_app():
         """, unsafe_allow_html=True)
         return False
 
+@st.cache_resource(show_spinner=False)
+def start_document_loading() -> threading.Thread:
+    """Start loading predefined documents on a background thread, once per process."""
+    def load():
+        load_predefined_documents()
+        # Build the search index here rather than on the first question
+        get_simple_knowledge_base().build_search_index()
+    
+    thread = threading.Thread(target=load, name="document-loader", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource(show_spinner=False)
+def start_sample_question_warmup() -> threading.Thread:
+    """Start precomputing example question answers on a background thread, once per process."""
+    thread = threading.Thread(target=warm_sample_questions, name="sample-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def warm_sample_questions():
+    """Generate and cache answers for every example question."""
+    from src.gemini_client import get_gemini_client
+    
+    # Wait for the documents so answers are cached under the final knowledge base fingerprint
+    start_document_loading().join()
+    
+    knowledge_base = get_simple_knowledge_base()
+    gemini_client = get_gemini_client()
+    response_cache = get_semantic_cache()
+    cache_namespace = knowledge_base.get_fingerprint()
+    
+    # Only generate answers that are not already cached
+    pending = []
+    for question in SAMPLE_QUESTIONS:
+        normalized_question = normalize_question(question)
+        if response_cache.get(normalized_question, cache_namespace) is None:
+            pending.append((question, normalized_question))
+    
+    if not pending:
+        return
+    
+    # Generate all answers in one concurrent batch instead of one request at a time
+    context_documents_list = [search_knowledge_base(normalized, 3, cache_namespace) for _, normalized in pending]
+    responses = gemini_client.generate_batch([question for question, _ in pending], context_documents_list)
+    
+    for (_, normalized_question), response in zip(pending, responses):
+        # Only cache successful, non-empty answers
+        if response['confidence'] > 0 and response['answer'].strip():
+            response_cache.put(normalized_question, response, cache_namespace)
+
+def load_ingest_state():
+    """Read the documents folder state saved by the last completed load."""
+    try:
+        with open(INGEST_STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_ingest_state(state):
+    """Persist the documents folder state after a completed load."""
+    try:
+        INGEST_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(INGEST_STATE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+    except OSError:
+        pass
+
 def load_predefined_documents():
     """Load documents from the predefined documents folder."""
-    documents_folder = Path("data/documents")
-    
-    if not documents_folder.exists():
-        documents_folder.mkdir(parents=True, exist_ok=True)
+    if not DOCUMENTS_FOLDER.exists():
+        DOCUMENTS_FOLDER.mkdir(parents=True, exist_ok=True)
         return
     
-    # Get all supported document files
-    supported_extensions = ['.txt', '.pdf', '.docx']
-    document_files = []
-    
-    for ext in supported_extensions:
-        document_files.extend(list(documents_folder.glob(f"*{ext}")))
+    knowledge_base = get_simple_knowledge_base()
     
-    if not document_files:
+    # Adding, removing or renaming a file bumps the folder mtime; the fingerprint
+    # covers the knowledge base file being reset while the folder stayed the same
+    folder_mtime_ns = DOCUMENTS_FOLDER.stat().st_mtime_ns
+    if load_ingest_state() == {'folder_mtime_ns': folder_mtime_ns, 'fingerprint': knowledge_base.get_fingerprint()}:
         return
     
-    # Load documents into knowledge base (silently)
-    loaded_count = 0
-    for doc_path in document_files:
+    if ingest_document_files(knowledge_base):
+        save_ingest_state({'folder_mtime_ns': folder_mtime_ns, 'fingerprint': knowledge_base.get_fingerprint()})
+
+def ingest_document_files(knowledge_base):
+    """Add any supported files in the documents folder that are not yet in the knowledge base.
+    
+    Returns True when every file was loaded, False if some should be retried next run.
+    """
+    # Get all supported document files in a single directory pass
+    supported_extensions = ('.txt', '.pdf', '.docx')
+    with os.scandir(DOCUMENTS_FOLDER) as entries:
+        document_files = [
+            entry for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(supported_extensions)
+        ]
+    
+    # Collect new documents and add them to the knowledge base in one batch (silently)
+    queued_titles = set()
+    pending_files = []
+    for entry in document_files:
+        # Skip documents already in the knowledge base or earlier in this run
+        if not knowledge_base.has_document(entry.name) and entry.name not in queued_titles:
+            queued_titles.add(entry.name)
+            pending_files.append(entry)
+    
+    if not pending_files:
+        return True
+    
+    # Extract text from all new files in parallel. Threads look up the extraction
+    # cache; cache misses are parsed in worker processes, which are only spawned
+    # on first use, so a fully cached load never starts any
+    max_workers = min(os.cpu_count() or 1, len(pending_files))
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as process_pool, \
+            ThreadPoolExecutor(max_workers=min(8, len(pending_files))) as executor:
+        futures = []
+        for entry in pending_files:
+            try:
+                # Cache keyed on (path, mtime, size) so edited files are re-extracted;
+                # DirEntry.stat() reuses what the directory scan already fetched where possible
+                file_stat = entry.stat()
+                futures.append((entry, file_stat, executor.submit(
+                    process_document_cached, entry.path, file_stat.st_mtime, file_stat.st_size, process_pool
+                )))
+            except OSError:
+                pass
+    
+    complete = len(futures) == len(pending_files)
+    new_documents = []
+    for entry, file_stat, future in futures:
         try:
-            # Check if document is already in knowledge base
-            existing_docs = st.session_state.knowledge_base.list_documents()
-            doc_titles = [doc.get('title', doc.get('filename', '')) for doc in existing_docs]
+            content = future.result()
             
-            if doc_path.name not in doc_titles:
-                # Read and process the document
-                content = process_document(str(doc_path))
+            if content:
+                new_documents.append({
+                    'title': entry.name,
+                    'content': content,
+                    'metadata': {
+                        'file_type': os.path.splitext(entry.name)[1].lower(),
+                        'file_size': file_stat.st_size,
+                        'added_date': datetime.now().isoformat(),
+                        'source': 'predefined'
+                    }
+                })
                 
-                if content:
-                    st.session_state.knowledge_base.add_document(
-                        title=doc_path.name,
-                        content=content,
-                        metadata={
-                            'file_type': doc_path.suffix.lower(),
-                            'file_size': doc_path.stat().st_size,
-                            'added_date': datetime.now().isoformat(),
-                            'source': 'predefined'
-                        }
-                    )
-                    loaded_count += 1
-                    
         except Exception as e:
-            # Silent loading - don't show warnings
-            pass
+            # Silent loading - don't show warnings; a failed extraction is
+            # not cached, so the file is retried on the next run
+            complete = False
+    
+    # 0 only means every file duplicated stored content; None is a failed save
+    if new_documents and knowledge_base.add_documents_batch(new_documents) is None:
+        complete = False
+    
+    return complete
 
 
 
-def load_book_image():
-    """Load and encode the promotional book image."""
+def convert_markdown_to_html(text):
+    """Convert the model's markdown answer to HTML for the styled answer box."""
     try:
-        image_path = Path("static/images/broke-no-more-transparent.png")
-        print(f"🔍 Looking for image at: {image_path.absolute()}")
-        print(f"📁 Image exists: {image_path.exists()}")
-        
-        if image_path.exists():
-            with open(image_path, "rb") as img_file:
-                image_data = base64.b64encode(img_file.read()).decode()
-                print(f"✅ Image loaded successfully! Size: {len(image_data)} characters")
-                return image_data
-        else:
-            print("❌ Image file not found - showing text-only promotional section")
-            return None
-    except Exception as e:
-        print(f"⚠️ Error loading image: {e}")
-        return None
+        # Try using markdown library if available
+        import markdown
+        html = markdown.markdown(text)
+        return html
+    except ImportError:
+        # Fallback to simple regex conversion
+        # Convert markdown headers to HTML headers
+        text = re.sub(r'^### (.*?)$', r'<h3>\1</h3>', text, flags=re.MULTILINE)
+        text = re.sub(r'^## (.*?)$', r'<h2>\1</h2>', text, flags=re.MULTILINE)
+        text = re.sub(r'^# (.*?)$', r'<h1>\1</h1>', text, flags=re.MULTILINE)
 
-def main():
-    """Main application function."""
-    
-    # Header
-    st.markdown("""
-    <div class="main-header">
-        <h1>💰 Personal Finance Q&A Assistant</h1>
-        <p>Get expert financial advice powered by AI and curated knowledge</p>
+        # Convert markdown lists to HTML lists
+        lines = text.split('\n')
+        html_lines = []
+        in_list = False
+
+        for line in lines:
+            if line.strip().startswith('•') or line.strip().startswith('-'):
+                if not in_list:
+                    html_lines.append('<ul>')
+                    in_list = True
+                item_text = line.strip()[1:].strip()
+                html_lines.append(f'<li>{item_text}</li>')
+            else:
+                if in_list:
+                    html_lines.append('</ul>')
+                    in_list = False
+                if line.strip() and not line.strip().startswith('<'):
+                    html_lines.append(f'<p>{line.strip()}</p>')
+                else:
+                    html_lines.append(line)
+
+        if in_list:
+            html_lines.append('</ul>')
+
+        return '\n'.join(html_lines)
+
+# Served by Streamlit's static file server (server.enableStaticServing) so the
+# browser fetches and caches it once instead of receiving it inline on every rerun
+BOOK_IMAGE_PATH = Path("static/images/broke-no-more-transparent.png")
+BOOK_IMAGE_URL = "./app/static/images/broke-no-more-transparent.png"
+
+BOOK_URL = "https://www.amazon.com/Broke-More-Easy-Follow-Strategies/dp/196628800X/ref=sr_1_2?crid=1I2229DFKOWE2&dib=eyJ2IjoiMSJ9.Y3EC7BYPotcNcCpQkFuWgyTURtZXDgSMa7v87YOnt6xEb5zqzgwRhigftpmGRMm4li93dXytUd--woy-3Rgy2IyLVY6WKfoqkPhv2wCyF6Hfw0BtnlDDAko1UEaUoucVe6Xkm91djx57Bhqy8Dzs2eNZKDL91bhxdBCwFUA-rQUqzyTIp7oB0OG_dWcP4nj1xEcm0eVBjM4sSSdmHdwiq2BQAFp1p9_rLQWo2z-n0_M.ogRhG6GClaDbNPhSUSXTVFswk4_0KRCJLAb9iR8n0S4&dib_tag=se&keywords=broke+no+more&qid=1751304047&sprefix=broke+no+more%2Caps%2C171&sr=8-2"
+
+# Promotional section with the book cover - entire section is clickable
+PROMO_WITH_IMAGE_HTML = """
+<div style="text-align: center; margin: 30px 0;">
+    <div style="margin-bottom: 10px;">
+        <p style="color: #2c3e50; font-size: 1.1em; font-weight: 700; margin: 0;">Built on Money Principles from</p>
     </div>
-    """, unsafe_allow_html=True)
-    
-    # Promotional section for "Broke No More" book
-    book_image_data = load_book_image()
-    
-    if book_image_data:
-        # Show promotional section with professional styling - entire section is clickable
-        st.markdown(f"""
-        <div style="text-align: center; margin: 30px 0;">
-            <div style="margin-bottom: 10px;">
-                <p style="color: #2c3e50; font-size: 1.1em; font-weight: 700; margin: 0;">Built on Money Principles from</p>
+    <a href="{book_url}" target="_blank" style="text-decoration: none; display: block;">
+        <div style="display: inline-block; background: white; padding: 20px; border-radius: 12px; box-shadow: 0 2px 15px rgba(0,0,0,0.08); transition: transform 0.2s ease, box-shadow 0.2s ease;" onmouseover="this.style.transform='translateY(-2px)'; this.style.boxShadow='0 4px 25px rgba(0,0,0,0.12)'" onmouseout="this.style.transform='translateY(0)'; this.style.boxShadow='0 2px 15px rgba(0,0,0,0.08)'">
+            <img src="{image_url}" alt="Broke No More - The Gen Z Guide to Money Mastery" loading="lazy" decoding="async" style="max-width: 280px; height: auto; border-radius: 8px;" class="responsive-book-img">
+            <div style="margin-top: 12px;">
+                <h3 style="color: #2c3e50; margin: 0; font-size: 1.2em; font-weight: 600;">'Broke No More'</h3>
+                <p style="color: #7f8c8d; margin: 4px 0 0 0; font-size: 0.9em;">📚 Link to the book</p>
             </div>
-            <a href="https://www.amazon.com/Broke-More-Easy-Follow-Strategies/dp/196628800X/ref=sr_1_2?crid=1I2229DFKOWE2&dib=eyJ2IjoiMSJ9.Y3EC7BYPotcNcCpQkFuWgyTURtZXDgSMa7v87YOnt6xEb5zqzgwRhigftpmGRMm4li93dXytUd--woy-3Rgy2IyLVY6WKfoqkPhv2wCyF6Hfw0BtnlDDAko1UEaUoucVe6Xkm91djx57Bhqy8Dzs2eNZKDL91bhxdBCwFUA-rQUqzyTIp7oB0OG_dWcP4nj1xEcm0eVBjM4sSSdmHdwiq2BQAFp1p9_rLQWo2z-n0_M.ogRhG6GClaDbNPhSUSXTVFswk4_0KRCJLAb9iR8n0S4&dib_tag=se&keywords=broke+no+more&qid=1751304047&sprefix=broke+no+more%2Caps%2C171&sr=8-2" target="_blank" style="text-decoration: none; display: block;">
-                <div style="display: inline-block; background: white; padding: 20px; border-radius: 12px; box-shadow: 0 2px 15px rgba(0,0,0,0.08); transition: transform 0.2s ease, box-shadow 0.2s ease;" onmouseover="this.style.transform='translateY(-2px)'; this.style.boxShadow='0 4px 25px rgba(0,0,0,0.12)'" onmouseout="this.style.transform='translateY(0)'; this.style.boxShadow='0 2px 15px rgba(0,0,0,0.08)'">
-                    <img src="data:image/png;base64,{book_image_data}" alt="Broke No More - The Gen Z Guide to Money Mastery" style="max-width: 280px; height: auto; border-radius: 8px;" class="responsive-book-img">
-                    <div style="margin-top: 12px;">
-                        <h3 style="color: #2c3e50; margin: 0; font-size: 1.2em; font-weight: 600;">'Broke No More'</h3>
-                        <p style="color: #7f8c8d; margin: 4px 0 0 0; font-size: 0.9em;">📚 Link to the book</p>
-                    </div>
-                </div>
-            </a>
         </div>
-        """, unsafe_allow_html=True)
-    else:
-        # Show text-only promotional section if image not available
-        st.markdown("""
-        <div style="text-align: center; margin: 30px 0; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 15px;">
-            <div style="background: white; padding: 20px; border-radius: 10px; display: inline-block; box-shadow: 0 8px 25px rgba(0,0,0,0.15);">
-                <h3 style="color: #333; margin-bottom: 5px;">📚 App Powered by the Book</h3>
-                <h4 style="color: #2563eb; margin: 0 0 10px 0; font-weight: 600;">'Broke No More'</h4>
-                <p style="color: #666; margin-bottom: 15px;">The Gen Z Guide to Money Mastery in 5 Weeks</p>
-                <a href="https://www.amazon.com/Broke-More-Easy-Follow-Strategies/dp/196628800X/ref=sr_1_2?crid=1I2229DFKOWE2&dib=eyJ2IjoiMSJ9.Y3EC7BYPotcNcCpQkFuWgyTURtZXDgSMa7v87YOnt6xEb5zqzgwRhigftpmGRMm4li93dXytUd--woy-3Rgy2IyLVY6WKfoqkPhv2wCyF6Hfw0BtnlDDAko1UEaUoucVe6Xkm91djx57Bhqy8Dzs2eNZKDL91bhxdBCwFUA-rQUqzyTIp7oB0OG_dWcP4nj1xEcm0eVBjM4sSSdmHdwiq2BQAFp1p9_rLQWo2z-n0_M.ogRhG6GClaDbNPhSUSXTVFswk4_0KRCJLAb9iR8n0S4&dib_tag=se&keywords=broke+no+more&qid=1751304047&sprefix=broke+no+more%2Caps%2C171&sr=8-2" target="_blank" style="background: #2563eb; color: white; padding: 12px 24px; border-radius: 6px; text-decoration: none; display: inline-block; font-weight: 600; transition: background 0.3s ease;" onmouseover="this.style.background='#1d4ed8'" onmouseout="this.style.background='#2563eb'">
-                    📖 Purchase on Amazon
-                </a>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    # Initialize application
-    if not initialize_app():
-        st.stop()
-    
-    # Main content area - full width
+    </a>
+</div>
+""".replace("{book_url}", BOOK_URL)
+
+# Text-only promotional section if the image is not available
+PROMO_TEXT_ONLY_HTML = """
+<div style="text-align: center; margin: 30px 0; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 15px;">
+    <div style="background: white; padding: 20px; border-radius: 10px; display: inline-block; box-shadow: 0 8px 25px rgba(0,0,0,0.15);">
+        <h3 style="color: #333; margin-bottom: 5px;">📚 App Powered by the Book</h3>
+        <h4 style="color: #2563eb; margin: 0 0 10px 0; font-weight: 600;">'Broke No More'</h4>
+        <p style="color: #666; margin-bottom: 15px;">The Gen Z Guide to Money Mastery in 5 Weeks</p>
+        <a href="{book_url}" target="_blank" style="background: #2563eb; color: white; padding: 12px 24px; border-radius: 6px; text-decoration: none; display: inline-block; font-weight: 600; transition: background 0.3s ease;" onmouseover="this.style.background='#1d4ed8'" onmouseout="this.style.background='#2563eb'">
+            📖 Purchase on Amazon
+        </a>
+    </div>
+</div>
+""".replace("{book_url}", BOOK_URL)
+
+def get_book_image_mtime() -> float:
+    """Get the promotional image's modification time, or 0.0 if it is missing."""
+    try:
+        return BOOK_IMAGE_PATH.stat().st_mtime
+    except OSError:
+        return 0.0
+
+@st.fragment
+def display_question_and_answer():
+    """Display the question form and answer; submitting reruns only this fragment."""
     st.markdown("## 💬 Ask Your Personal Finance Question")
     
     # Initialize selected question in session state
     if 'selected_question' not in st.session_state:
         st.session_state.selected_question = ""
     
-    # Question input
-    user_question = st.text_area(
-        "What would you like to know about personal finance?",
-        value=st.session_state.selected_question,
-        placeholder="e.g., How should I start investing as a beginner? What's the best way to create a budget?",
-        height=120,
-        help="Ask specific questions about budgeting, investing, saving, debt management, or other financial topics."
-    )
-    
-    # Submit button - fixed size and centered
-    st.markdown("""
-    <style>
-        .stButton > button[kind="primary"] {
-            width: 300px !important;
-            height: 70px !important;
-            font-size: 22px !important;
-            font-weight: 800 !important;
-            border-radius: 8px !important;
-            background-color: #ff4b4b !important;
-            border-color: #ff4b4b !important;
-        }
-        .stButton > button[kind="primary"]:hover {
-            background-color: #ff6b6b !important;
-            border-color: #ff6b6b !important;
-        }
-        .main-button-container {
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            margin: 30px 0;
-            width: 100%;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-    
-    # Center the button using columns but handle response outside columns
-    col1, col2, col3 = st.columns([2, 1, 2])
-    with col2:
-        button_clicked = st.button("🔍 Get Expert Answer", type="primary", key="expert_answer_btn")
+    # Question input and submit button in a form so editing the question doesn't trigger reruns
+    with st.form("question_form", border=False):
+        user_question = st.text_area(
+            "What would you like to know about personal finance?",
+            value=st.session_state.selected_question,
+            placeholder="e.g., How should I start investing as a beginner? What's the best way to create a budget?",
+            height=120,
+            help="Ask specific questions about budgeting, investing, saving, debt management, or other financial topics."
+        )
+        
+        # Center the button using columns but handle response outside columns
+        col1, col2, col3 = st.columns([2, 1, 2])
+        with col2:
+            button_clicked = st.form_submit_button("🔍 Get Expert Answer", type="primary")
     
     # Handle button response outside of column context for full-width display
     if button_clicked:
-        if not user_question.strip():
+        # Normalize once for validation, search and cache lookups; the original text goes to the model
+        normalized_question = normalize_question(user_question)
+        
+        if not normalized_question:
             st.warning("📝 Please enter a question first.")
+        elif len(normalized_question) < 3 or not any(c.isalpha() for c in normalized_question):
+            # Reject junk input before any validation, search or model work
+            st.warning("📝 Please ask a complete finance question.")
         else:
             # Clear the selected question from session state
             st.session_state.selected_question = ""
             
             # Validate if it's a finance-related question
-            if not validate_finance_question(user_question):
+            if not validate_finance_question(normalized_question):
                 st.markdown("""
                 <div class="warning-box">
                     <strong>⚠️ Not a finance question</strong><br>
@@ -370,134 +604,64 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
             else:
+                if start_document_loading().is_alive():
+                    st.caption("📚 Still indexing reference documents - this answer may draw on fewer sources.")
+                
                 # Process the question
                 with st.spinner("🤔 Thinking and analyzing your question..."):
                     try:
-                        # Search knowledge base
-                        relevant_docs = st.session_state.knowledge_base.search(user_question, top_k=3)
-                        
-                        # Generate response using Gemini
-                        response = st.session_state.gemini_client.generate_response(
-                            question=user_question,
-                            context_documents=relevant_docs
-                        )
-                        
                         # Display response - clean format without confidence or sources
                         st.markdown("### 💡 Expert Answer")
                         
-                        # Apply consistent CSS styling for the answer
-                        st.markdown("""
-                        <style>
-                        .expert-answer {
-                            font-family: 'Source Sans Pro', sans-serif;
-                            font-size: 16px !important;
-                            line-height: 1.6;
-                            color: #262730;
-                            background-color: #ffffff;
-                            padding: 20px;
-                            border-radius: 8px;
-                            border: 1px solid #e6e6e6;
-                        }
-                        .expert-answer p {
-                            font-size: 16px !important;
-                            margin: 16px 0 !important;
-                            font-weight: 400 !important;
-                        }
-                        .expert-answer strong, .expert-answer b {
-                            font-weight: 600 !important;
-                            font-size: 16px !important;
-                        }
-                        .expert-answer em, .expert-answer i {
-                            font-style: italic !important;
-                            font-size: 16px !important;
-                            font-weight: 400 !important;
-                        }
-                        .expert-answer ul, .expert-answer ol {
-                            margin: 16px 0 !important;
-                            padding-left: 20px !important;
-                        }
-                        .expert-answer li {
-                            font-size: 16px !important;
-                            margin: 6px 0 !important;
-                            font-weight: 400 !important;
-                            line-height: 1.5;
-                        }
-                        /* Make subheaders visually distinct but proportional */
-                        .expert-answer h1 {
-                            font-size: 20px !important;
-                            font-weight: 700 !important;
-                            margin: 24px 0 12px 0 !important;
-                            color: #1e3a8a !important;
-                            border-bottom: 2px solid #e6e6e6 !important;
-                            padding-bottom: 8px !important;
-                        }
-                        .expert-answer h2 {
-                            font-size: 18px !important;
-                            font-weight: 600 !important;
-                            margin: 20px 0 10px 0 !important;
-                            color: #1e40af !important;
-                        }
-                        .expert-answer h3 {
-                            font-size: 16px !important;
-                            font-weight: 600 !important;
-                            margin: 16px 0 8px 0 !important;
-                            color: #3b82f6 !important;
-                        }
-                        .expert-answer h4, .expert-answer h5, .expert-answer h6 {
-                            font-size: 16px !important;
-                            font-weight: 600 !important;
-                            margin: 16px 0 8px 0 !important;
-                            color: #64748b !important;
-                        }
-                        </style>
-                        """, unsafe_allow_html=True)
+                        # Serve repeated questions from the response cache
+                        knowledge_base = get_simple_knowledge_base()
+                        response_cache = get_semantic_cache()
+                        cache_namespace = knowledge_base.get_fingerprint()
+                        response = response_cache.get(normalized_question, cache_namespace)
+                        answer_placeholder = st.empty()
+                        from src.gemini_client import get_gemini_client
+                        gemini_client = get_gemini_client()
                         
-                        # Process markdown to HTML for proper header rendering
-                        import re
+                        # Fall back to embedding similarity to catch paraphrased questions
+                        question_embedding = None
+                        relevant_docs = None
+                        if response is None and get_settings().CACHE_USE_EMBEDDINGS:
+                            # Embed on a worker thread while the search a cache miss needs runs here
+                            with ThreadPoolExecutor(max_workers=1) as executor:
+                                embedding_future = executor.submit(gemini_client.embed_text, normalized_question)
+                                relevant_docs = search_knowledge_base(normalized_question, 3, cache_namespace)
+                                question_embedding = embedding_future.result()
+                            if question_embedding is not None:
+                                response = response_cache.get_similar(normalized_question, question_embedding, cache_namespace)
                         
-                        def convert_markdown_to_html(text):
-                            try:
-                                # Try using markdown library if available
-                                import markdown
-                                html = markdown.markdown(text)
-                                return html
-                            except ImportError:
-                                # Fallback to simple regex conversion
-                                # Convert markdown headers to HTML headers
-                                text = re.sub(r'^### (.*?)$', r'<h3>\1</h3>', text, flags=re.MULTILINE)
-                                text = re.sub(r'^## (.*?)$', r'<h2>\1</h2>', text, flags=re.MULTILINE)
-                                text = re.sub(r'^# (.*?)$', r'<h1>\1</h1>', text, flags=re.MULTILINE)
-                                
-                                # Convert markdown lists to HTML lists
-                                lines = text.split('\n')
-                                html_lines = []
-                                in_list = False
-                                
-                                for line in lines:
-                                    if line.strip().startswith('•') or line.strip().startswith('-'):
-                                        if not in_list:
-                                            html_lines.append('<ul>')
-                                            in_list = True
-                                        item_text = line.strip()[1:].strip()
-                                        html_lines.append(f'<li>{item_text}</li>')
-                                    else:
-                                        if in_list:
-                                            html_lines.append('</ul>')
-                                            in_list = False
-                                        if line.strip() and not line.strip().startswith('<'):
-                                            html_lines.append(f'<p>{line.strip()}</p>')
-                                        else:
-                                            html_lines.append(line)
-                                
-                                if in_list:
-                                    html_lines.append('</ul>')
-                                
-                                return '\n'.join(html_lines)
+                        if response is None:
+                            # Search knowledge base (memoized on the normalized question)
+                            if relevant_docs is None:
+                                relevant_docs = search_knowledge_base(normalized_question, 3, cache_namespace)
+                            
+                            # Stream the response from Gemini so text appears as it is generated
+                            answer = ""
+                            for text in gemini_client.generate_response_stream(
+                                question=user_question,
+                                context_documents=relevant_docs
+                            ):
+                                answer += text
+                                answer_placeholder.markdown(
+                                    f'<div class="expert-answer">{convert_markdown_to_html(answer)}</div>',
+                                    unsafe_allow_html=True
+                                )
+                            
+                            # Never cache a blank answer; report it like any other generation error
+                            if not answer.strip():
+                                raise ValueError("The model returned an empty answer. Please try again.")
+                            
+                            response = gemini_client.build_response(answer, relevant_docs)
+                            response_cache.put(normalized_question, response, cache_namespace, embedding=question_embedding)
                         
                         # Convert markdown to HTML
                         final_answer = convert_markdown_to_html(response['answer'])
                         
-                        st.markdown(f'<div class="expert-answer">{final_answer}</div>', unsafe_allow_html=True)
+                        answer_placeholder.markdown(f'<div class="expert-answer">{final_answer}</div>', unsafe_allow_html=True)
                         
                     except Exception as e:
                         st.error(f"❌ **Error generating response:** {str(e)}")
@@ -511,55 +675,21 @@ def main():
                             </ul>
                         </div>
                         """, unsafe_allow_html=True)
-    
-    # Sample questions - moved above tips
-    st.markdown("---")
-    
+
+@st.fragment
+def display_sample_questions():
+    """Display example questions; refreshing them reruns only this fragment."""
     st.markdown("### 🎯 Example Questions")
     st.markdown("Click any question below to auto-fill the input field:")
     
-    # Comprehensive list of finance questions covering various topics
-    all_questions = [
-        "What's the 50/30/20 budgeting rule?",
-        "How do I start an emergency fund?",
-        "What's the difference between 401k and IRA?",
-        "Should I pay off debt or invest first?",
-        "How much house can I afford?",
-        "What is compound interest and how does it work?",
-        "How do I improve my credit score?",
-        "What's the difference between stocks and bonds?",
-        "How much should I save for retirement?",
-        "What is dollar-cost averaging?",
-        "Should I get a financial advisor?",
-        "How do I create a budget from scratch?",
-        "What's the difference between Roth and traditional IRA?",
-        "How do I negotiate my salary?",
-        "What insurance do I really need?",
-        "How do I start investing with little money?",
-        "What's the avalanche vs snowball debt method?",
-        "How do I save money on groceries?",
-        "What are index funds and ETFs?",
-        "How do I plan for major expenses?",
-        "What's the difference between debit and credit cards?",
-        "How do I protect myself from identity theft?",
-        "What are the tax benefits of homeownership?",
-        "How do I choose a bank or credit union?",
-        "What's a good debt-to-income ratio?",
-        "How do I save for my child's education?",
-        "What are the basics of estate planning?",
-        "How do I manage money as a couple?",
-        "What's the difference between gross and net income?",
-        "How do I prepare for financial emergencies?"
-    ]
-    
-    # Refresh button below the heading
+    # Refresh button below the heading - the questions render further down in this
+    # same fragment run, so no st.rerun() is needed to show the new selection
     if st.button("🔄 Refresh", help="Get new example questions", key="refresh_questions", type="secondary"):
-        st.session_state.current_sample_questions = random.sample(all_questions, 5)
-        st.rerun()
+        st.session_state.current_sample_questions = random.sample(SAMPLE_QUESTIONS, 5)
     
     # Randomly select 5 questions to display
     if 'current_sample_questions' not in st.session_state:
-        st.session_state.current_sample_questions = random.sample(all_questions, 5)
+        st.session_state.current_sample_questions = random.sample(SAMPLE_QUESTIONS, 5)
     
     sample_questions = st.session_state.current_sample_questions
     
@@ -578,6 +708,7 @@ def main():
                     with col:
                         if st.button(f"💭 {question}", key=button_key, type="secondary", use_container_width=True):
                             st.session_state.selected_question = question
+                            # Full rerun so the question box outside this fragment is refilled
                             st.rerun()
     else:
         # For fewer questions, use regular column layout
@@ -587,6 +718,40 @@ def main():
                 if st.button(f"💭 {question}", key=f"sample_{i}", type="secondary", use_container_width=True):
                     st.session_state.selected_question = question
                     st.rerun()
+
+def main():
+    """Main application function."""
+    
+    # Header
+    st.markdown("""
+    <div class="main-header">
+        <h1>💰 Personal Finance Q&A Assistant</h1>
+        <p>Get expert financial advice powered by AI and curated knowledge</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Promotional section for "Broke No More" book
+    book_image_mtime = get_book_image_mtime()
+    
+    if book_image_mtime:
+        # Show promotional section with professional styling - entire section is clickable
+        image_url = f"{BOOK_IMAGE_URL}?v={int(book_image_mtime)}"
+        st.markdown(PROMO_WITH_IMAGE_HTML.replace("{image_url}", image_url), unsafe_allow_html=True)
+    else:
+        # Show text-only promotional section if image not available
+        st.markdown(PROMO_TEXT_ONLY_HTML, unsafe_allow_html=True)
+    
+    # Initialize application
+    if not initialize_app():
+        st.stop()
+    
+    # Main content area - full width
+    display_question_and_answer()
+    
+    # Sample questions - moved above tips
+    st.markdown("---")
+    
+    display_sample_questions()
     
     # Tips section
     st.markdown("---")
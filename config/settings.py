@@ -4,6 +4,11 @@ import os
 from typing import Dict, Any
 from dotenv import load_dotenv
 
+try:
+    import streamlit as st
+except ImportError:
+    st = None
+
 # Load environment variables
 load_dotenv()
 
@@ -14,7 +19,6 @@ class Settings:
     @property 
     def GEMINI_API_KEY(self) -> str:
         try:
-            import streamlit as st
             return st.secrets.get("GEMINI_API_KEY", os.getenv("GEMINI_API_KEY", ""))
         except:
             return os.getenv("GEMINI_API_KEY", "")
@@ -22,11 +26,13 @@ class Settings:
     @property
     def GEMINI_MODEL(self) -> str:
         try:
-            import streamlit as st
             return st.secrets.get("GEMINI_MODEL", os.getenv("GEMINI_MODEL", "gemini-1.5-flash"))
         except:
             return os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    GEMINI_EMBEDDING_MODEL: str = os.getenv("GEMINI_EMBEDDING_MODEL", "models/text-embedding-004")
+    GEMINI_MAX_RETRIES: int = 3
+    GEMINI_RETRY_BASE_DELAY: float = 0.5
     
     # App Configuration
     APP_TITLE: str = os.getenv("APP_TITLE", "Personal Finance Assistant")
@@ -45,7 +51,18 @@ class Settings:
     CHUNK_OVERLAP: int = 200
     TOP_K_RESULTS: int = 5
     SIMILARITY_THRESHOLD: float = 0.7
-    
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    MAX_CONTEXT_DOC_CHARS: int = 2000
+    MAX_CONTEXT_CHARS: int = 8000
+
+    # Response Cache Configuration
+    CACHE_MAX_SIZE: int = 256
+    CACHE_TTL_SECONDS: int = 3600
+    CACHE_USE_EMBEDDINGS: bool = os.getenv("CACHE_USE_EMBEDDINGS", "true").lower() == "true"
+    CACHE_EMBEDDING_SIMILARITY_THRESHOLD: float = 0.93
+    WARM_SAMPLE_QUESTIONS: bool = os.getenv("WARM_SAMPLE_QUESTIONS", "false").lower() == "true"
+
     # UI Configuration
     PAGE_TITLE: str = "💰 Personal Finance Assistant"
     PAGE_ICON: str = "💰"
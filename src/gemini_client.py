@@ -1,73 +1,19 @@
 """Gemini API client for generating finance-related responses."""
 
+import time
+import random
+import asyncio
 import google.generativeai as genai
 import streamlit as st
-from typing import List, Optional, Dict, Any
+from google.api_core import exceptions as google_exceptions
+from typing import Callable, Iterator, List, Optional, Dict, Any
 from config.settings import settings
 
+# Rate limiting and temporary outages are worth retrying; other errors are not
+RETRYABLE_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable)
 
-class GeminiClient:
-    """Client for interacting with Google's Gemini API."""
-    
-    def __init__(self, api_key: str = None):
-        """Initialize the Gemini client."""
-        # Use provided API key or fall back to settings
-        self.api_key = api_key or settings.GEMINI_API_KEY
-        
-        if not self.api_key or self.api_key == "your_gemini_api_key_here":
-            raise ValueError("GEMINI_API_KEY is not set or invalid")
-        
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
-    
-    def generate_response(self, question: str = None, context_documents: List[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Generate a response based on the question and relevant context documents."""
-        try:
-            # Handle different parameter formats
-            if context_documents is None:
-                context_documents = []
-            
-            # Extract text content from context documents
-            if context_documents and isinstance(context_documents[0], dict):
-                context_texts = [doc.get('content', str(doc)) for doc in context_documents]
-            else:
-                context_texts = [str(doc) for doc in context_documents]
-            
-            # Create the prompt with context
-            prompt = self._create_prompt(question, context_texts)
-            
-            # Generate response
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    max_output_tokens=settings.MAX_TOKENS,
-                    temperature=settings.TEMPERATURE,
-                )
-            )
-            
-            # Return structured response
-            return {
-                'answer': response.text,
-                'confidence': 0.8 if context_texts else 0.5,  # Simple confidence scoring
-                'sources': context_documents[:3] if context_documents else []  # Return top 3 sources
-            }
-            
-        except Exception as e:
-            st.error(f"Error generating response: {str(e)}")
-            return {
-                'answer': "I'm sorry, I encountered an error while generating a response. Please try again.",
-                'confidence': 0.0,
-                'sources': []
-            }
-    
-    def _create_prompt(self, question: str, context_documents: List[str]) -> str:
-        """Create a structured prompt for the Gemini model."""
-        if context_documents:
-            context = "\n\n".join([f"Reference Material {i+1}:\n{doc}" for i, doc in enumerate(context_documents)])
-        else:
-            context = "No specific reference material provided."
-        
-        prompt = f"""You are a highly knowledgeable Certified Financial Planner (CFP) and personal finance expert with over 20 years of experience helping people achieve their financial goals. You have deep expertise in budgeting, investing, debt management, retirement planning, insurance, and tax strategies.
+# Instructions sent with every question; filled in with str.format by _create_prompt
+PROMPT_TEMPLATE = """You are a highly knowledgeable Certified Financial Planner (CFP) and personal finance expert with over 20 years of experience helping people achieve their financial goals. You have deep expertise in budgeting, investing, debt management, retirement planning, insurance, and tax strategies.
 
 IMPORTANT - Your Response Style:
 • Respond as a confident financial expert and educator
@@ -112,7 +58,186 @@ QUESTION: {question}
 
 Provide a comprehensive, well-structured expert response that educates and empowers the person to make informed financial decisions:"""
 
-        return prompt
+
+class GeminiClient:
+    """Client for interacting with Google's Gemini API."""
+    
+    def __init__(self, api_key: str = None):
+        """Initialize the Gemini client."""
+        # Use provided API key or fall back to settings
+        self.api_key = api_key or settings.GEMINI_API_KEY
+        
+        if not self.api_key or self.api_key == "your_gemini_api_key_here":
+            raise ValueError("GEMINI_API_KEY is not set or invalid")
+        
+        genai.configure(api_key=self.api_key)
+        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+    
+    def generate_response(self, question: str = None, context_documents: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Generate a response based on the question and relevant context documents."""
+        try:
+            # Handle different parameter formats
+            if context_documents is None:
+                context_documents = []
+            
+            # Create the prompt with context
+            prompt = self._create_prompt(question, self._extract_context_texts(context_documents))
+            
+            # Generate response
+            response = self._with_retries(self.model.generate_content, prompt, generation_config=self._generation_config())
+            
+            # Return structured response
+            return self.build_response(response.text, context_documents)
+            
+        except Exception as e:
+            st.error(f"Error generating response: {str(e)}")
+            return self._error_response()
+    
+    def generate_batch(self, questions: List[str], context_documents_list: List[List[Dict[str, Any]]], max_concurrency: int = 5) -> List[Dict[str, Any]]:
+        """Generate responses for several questions concurrently, in input order."""
+        return asyncio.run(self._generate_batch_async(questions, context_documents_list, max_concurrency))
+    
+    async def _generate_batch_async(self, questions: List[str], context_documents_list: List[List[Dict[str, Any]]], max_concurrency: int) -> List[Dict[str, Any]]:
+        """Run generate requests with at most max_concurrency in flight."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def generate_one(question: str, context_documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    prompt = self._create_prompt(question, self._extract_context_texts(context_documents))
+                    response = await self._with_retries_async(self.model.generate_content_async, prompt, generation_config=self._generation_config())
+                    return self.build_response(response.text, context_documents)
+                except Exception:
+                    return self._error_response()
+        
+        return await asyncio.gather(*(
+            generate_one(question, context_documents or [])
+            for question, context_documents in zip(questions, context_documents_list)
+        ))
+    
+    @staticmethod
+    def _retry_delay(attempt: int) -> float:
+        """Get the jittered exponential backoff before the given retry attempt."""
+        return min(settings.GEMINI_RETRY_BASE_DELAY * 2 ** attempt, 8.0) * random.uniform(0.5, 1.5)
+    
+    def _with_retries(self, call: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call the Gemini API, retrying rate-limit and unavailable errors with backoff."""
+        for attempt in range(settings.GEMINI_MAX_RETRIES):
+            try:
+                return call(*args, **kwargs)
+            except RETRYABLE_ERRORS:
+                time.sleep(self._retry_delay(attempt))
+        return call(*args, **kwargs)
+    
+    async def _with_retries_async(self, call: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Await a Gemini API call, retrying rate-limit and unavailable errors with backoff."""
+        for attempt in range(settings.GEMINI_MAX_RETRIES):
+            try:
+                return await call(*args, **kwargs)
+            except RETRYABLE_ERRORS:
+                await asyncio.sleep(self._retry_delay(attempt))
+        return await call(*args, **kwargs)
+    
+    @staticmethod
+    def _error_response() -> Dict[str, Any]:
+        """Get the response returned when generation fails."""
+        return {
+            'answer': "I'm sorry, I encountered an error while generating a response. Please try again.",
+            'confidence': 0.0,
+            'sources': []
+        }
+    
+    def generate_response_stream(self, question: str = None, context_documents: List[Dict[str, Any]] = None) -> Iterator[str]:
+        """Generate a response as a stream of text chunks.
+        
+        Errors are raised to the caller, which may already have rendered part of the answer.
+        """
+        if context_documents is None:
+            context_documents = []
+        
+        prompt = self._create_prompt(question, self._extract_context_texts(context_documents))
+        
+        # Only the request itself is retried; once chunks are yielded a retry would repeat text
+        response = self._with_retries(self.model.generate_content, prompt, generation_config=self._generation_config(), stream=True)
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    
+    def build_response(self, answer: str, context_documents: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the structured response returned for a generated answer."""
+        context_documents = context_documents or []
+        return {
+            'answer': answer,
+            'confidence': 0.8 if context_documents else 0.5,  # Simple confidence scoring
+            'sources': self._summarize_sources(context_documents[:3])  # Return top 3 sources
+        }
+    
+    def embed_text(self, text: str) -> Optional[List[float]]:
+        """Embed text with the Gemini embedding model, or return None if the call fails."""
+        try:
+            result = genai.embed_content(
+                model=settings.GEMINI_EMBEDDING_MODEL,
+                content=text,
+                task_type="semantic_similarity"
+            )
+            return result['embedding']
+        except Exception:
+            # Embeddings only improve cache hits, so a failure is not worth surfacing
+            return None
+    
+    @staticmethod
+    def _extract_context_texts(context_documents: List[Any]) -> List[str]:
+        """Extract text content from context documents."""
+        if context_documents and isinstance(context_documents[0], dict):
+            return [doc.get('content', str(doc)) for doc in context_documents]
+        return [str(doc) for doc in context_documents]
+    
+    @staticmethod
+    def _generation_config() -> "genai.types.GenerationConfig":
+        """Get the generation settings used for every request."""
+        return genai.types.GenerationConfig(
+            max_output_tokens=settings.MAX_TOKENS,
+            temperature=settings.TEMPERATURE,
+        )
+    
+    @staticmethod
+    def _summarize_sources(context_documents: List[Any]) -> List[Dict[str, Any]]:
+        """Reduce source documents to lightweight previews for display and caching."""
+        sources = []
+        for doc in context_documents:
+            if isinstance(doc, dict):
+                sources.append({
+                    'title': doc.get('title', doc.get('filename', '')),
+                    'filename': doc.get('filename', ''),
+                    'similarity': doc.get('similarity', 0.0),
+                    'preview': doc.get('content', '')[:200]
+                })
+            else:
+                sources.append({'title': '', 'filename': '', 'similarity': 0.0, 'preview': str(doc)[:200]})
+        return sources
+    
+    def _create_prompt(self, question: str, context_documents: List[str]) -> str:
+        """Create a structured prompt for the Gemini model."""
+        # Cap each document and the total so input tokens (and latency) stay bounded;
+        # documents arrive most relevant first, so the tail is what gets dropped
+        context_parts = []
+        remaining = settings.MAX_CONTEXT_CHARS
+        for doc in context_documents:
+            if len(doc) > settings.MAX_CONTEXT_DOC_CHARS:
+                # Prefer ending a truncated document at a sentence boundary
+                doc = doc[:settings.MAX_CONTEXT_DOC_CHARS]
+                sentence_end = doc.rfind('.')
+                if sentence_end > settings.MAX_CONTEXT_DOC_CHARS // 2:
+                    doc = doc[:sentence_end + 1]
+            if len(doc) > remaining:
+                break
+            context_parts.append(doc)
+            remaining -= len(doc)
+        
+        # A plain separator instead of numbered headers the model is told not to mention
+        context = "\n\n---\n\n".join(context_parts) or "No specific reference material provided."
+        
+        return PROMPT_TEMPLATE.format(context=context, question=question)
     
     def test_connection(self) -> bool:
         """Test the connection to Gemini API."""
@@ -126,10 +251,10 @@ Provide a comprehensive, well-structured expert response that educates and empow
 
 # Global client instance
 @st.cache_resource
-def get_gemini_client() -> Optional[GeminiClient]:
-    """Get a cached Gemini client instance."""
-    try:
-        return GeminiClient()
-    except Exception as e:
-        st.error(f"Failed to initialize Gemini client: {str(e)}")
-        return None 
\ No newline at end of file
+def get_gemini_client() -> GeminiClient:
+    """Get a cached Gemini client instance.
+    
+    Initialization errors are raised rather than cached, so a fixed API key
+    is picked up on the next run without restarting the app.
+    """
+    return GeminiClient() 
\ No newline at end of file
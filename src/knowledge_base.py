@@ -1,13 +1,27 @@
 """Knowledge base management with vector storage and retrieval."""
 
 import os
+import atexit
+import shelve
+import threading
+import numpy as np
 import streamlit as st
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any, Optional, Tuple
 from config.settings import settings
-from src.utils import chunk_text, get_file_hash
+from src.utils import chunk_text, get_file_hash, get_text_hash
+
+# Cosine distance matches the normalized sentence embeddings; the HNSW graph
+# parameters trade a slower build for faster, more accurate queries
+COLLECTION_METADATA = {
+    "description": "Financial documents and advice",
+    "hnsw:space": "cosine",
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 32,
+    "hnsw:search_ef": 64
+}
 
 
 class KnowledgeBase:
@@ -19,6 +33,13 @@ class KnowledgeBase:
         self.embedding_model = self._load_embedding_model()
         self.client = self._initialize_chroma_client()
         self.collection = self._get_or_create_collection()
+        # Per-document summaries keyed by doc_hash, kept in step with the collection
+        self._documents = self._load_document_index()
+        # Embeddings keyed by chunk hash, so re-ingesting an edited document
+        # only encodes the chunks that actually changed
+        self._embedding_cache = shelve.open(os.path.join(settings.CHROMA_DB_DIR, "embedding_cache"))
+        self._embedding_cache_lock = threading.Lock()
+        self._encode_pool = None
     
     @st.cache_resource
     def _load_embedding_model(_self):
@@ -45,12 +66,93 @@ class KnowledgeBase:
     def _get_or_create_collection(self):
         """Get or create the ChromaDB collection."""
         try:
-            return self.client.get_collection(name=self.collection_name)
+            collection = self.client.get_collection(name=self.collection_name)
+        except:
+            # A migration that stopped after dropping the old collection left
+            # the complete copy under its temporary name
+            try:
+                collection = self.client.get_collection(name=self._migration_name())
+                collection.modify(name=self.collection_name)
+                return collection
+            except:
+                return self.client.create_collection(
+                    name=self.collection_name,
+                    metadata=COLLECTION_METADATA
+                )
+        
+        # HNSW settings are fixed when a collection is created, so collections
+        # made with the default L2 space are copied into a new cosine one
+        if (collection.metadata or {}).get("hnsw:space") != COLLECTION_METADATA["hnsw:space"]:
+            collection = self._migrate_collection(collection)
+        return collection
+    
+    def _migrate_collection(self, collection):
+        """Recreate the collection with the current HNSW settings, keeping its chunks.
+        
+        The chunks are copied into a temporary collection first, and the old one is
+        only dropped once the copy is complete. If copying fails the old collection
+        is kept as it is and migration is retried on the next start.
+        """
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        
+        migration_name = self._migration_name()
+        try:
+            # Leftover from an interrupted copy; the old collection was still intact
+            self.client.delete_collection(migration_name)
         except:
-            return self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "Financial documents and advice"}
+            pass
+        
+        try:
+            migrated = self.client.create_collection(
+                name=migration_name,
+                metadata=COLLECTION_METADATA
             )
+            
+            # Re-add in slices to stay under ChromaDB's maximum batch size
+            batch_size = 1000
+            for start in range(0, len(data['ids']), batch_size):
+                end = start + batch_size
+                migrated.add(
+                    ids=data['ids'][start:end],
+                    embeddings=data['embeddings'][start:end],
+                    documents=data['documents'][start:end],
+                    metadatas=data['metadatas'][start:end]
+                )
+        except Exception as e:
+            st.warning(f"Could not migrate the knowledge base collection: {str(e)}")
+            try:
+                self.client.delete_collection(migration_name)
+            except:
+                pass
+            return collection
+        
+        self.client.delete_collection(self.collection_name)
+        migrated.modify(name=self.collection_name)
+        return migrated
+    
+    def _migration_name(self) -> str:
+        """Get the temporary collection name used while migrating."""
+        return f"{self.collection_name}_migration"
+    
+    def _load_document_index(self) -> Dict[str, Dict[str, Any]]:
+        """Summarize stored documents in one pass over the chunk metadata."""
+        try:
+            results = self.collection.get(include=["metadatas"])
+            
+            # Group by document (doc_hash) to avoid duplicates from chunks
+            documents = {}
+            for metadata in results['metadatas']:
+                doc_hash = metadata['doc_hash']
+                if doc_hash not in documents:
+                    documents[doc_hash] = {
+                        'filename': metadata['filename'],
+                        'file_type': metadata['file_type'],
+                        'doc_hash': doc_hash,
+                        'total_chunks': metadata.get('total_chunks', 1)
+                    }
+            return documents
+        except Exception:
+            return {}
     
     def add_document(self, content: str, filename: str, file_type: str = "text") -> bool:
         """Add a document to the knowledge base."""
@@ -67,7 +169,7 @@ class KnowledgeBase:
             chunks = chunk_text(content, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
             
             # Generate unique IDs and metadata
-            doc_hash = get_file_hash(content.encode())
+            doc_hash = get_text_hash(content)
             
             # Check if document already exists
             if self.document_exists(doc_hash):
@@ -90,8 +192,8 @@ class KnowledgeBase:
                     "total_chunks": len(chunks)
                 })
             
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(documents).tolist()
+            # Generate embeddings, reusing cached ones for unchanged chunks
+            embeddings = self._encode_chunks(documents)
             
             # Add to ChromaDB
             self.collection.add(
@@ -100,6 +202,12 @@ class KnowledgeBase:
                 documents=documents,
                 metadatas=metadatas
             )
+            self._documents[doc_hash] = {
+                'filename': filename,
+                'file_type': file_type,
+                'doc_hash': doc_hash,
+                'total_chunks': len(chunks)
+            }
             
             st.success(f"Successfully added '{filename}' to knowledge base ({len(chunks)} chunks)")
             return True
@@ -108,6 +216,53 @@ class KnowledgeBase:
             st.error(f"Error adding document to knowledge base: {str(e)}")
             return False
     
+    def _encode_chunks(self, chunks: List[str]) -> np.ndarray:
+        """Embed chunks as unit-length vectors, encoding only those not already cached."""
+        keys = [get_file_hash(chunk.encode()) for chunk in chunks]
+        
+        with self._embedding_cache_lock:
+            cached = {key: self._embedding_cache.get(key) for key in set(keys)}
+        
+        missing = {key: chunk for key, chunk in zip(keys, chunks) if cached[key] is None}
+        if missing:
+            texts = list(missing.values())
+            if len(texts) > 256 and (os.cpu_count() or 1) > 1:
+                # Large documents are spread over one worker process per CPU
+                encoded = self.embedding_model.encode_multi_process(
+                    texts,
+                    self._get_encode_pool(),
+                    batch_size=64,
+                    normalize_embeddings=True
+                )
+            else:
+                # Encode in larger batches; encode() already length-sorts chunks to limit padding
+                encoded = self.embedding_model.encode(
+                    texts,
+                    batch_size=64,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                )
+            
+            with self._embedding_cache_lock:
+                for key, embedding in zip(missing, encoded):
+                    # Stored as float16 bytes to halve the cache size on disk
+                    cached[key] = self._embedding_cache[key] = embedding.astype(np.float16).tobytes()
+                self._embedding_cache.sync()
+        
+        return np.vstack([np.frombuffer(cached[key], dtype=np.float16) for key in keys]).astype(np.float32)
+    
+    def _get_encode_pool(self) -> Dict[str, Any]:
+        """Start the multi-process encoding pool on first use.
+        
+        Each worker holds its own copy of the embedding model, so the pool is
+        only started for large documents and kept until the process exits.
+        """
+        if self._encode_pool is None:
+            self._encode_pool = self.embedding_model.start_multi_process_pool()
+            atexit.register(self.embedding_model.stop_multi_process_pool, self._encode_pool)
+        return self._encode_pool
+    
     def search_documents(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
         """Search for relevant documents based on the query."""
         try:
@@ -118,11 +273,11 @@ class KnowledgeBase:
                 top_k = settings.TOP_K_RESULTS
             
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            query_embedding = self.embedding_model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
             
             # Search in ChromaDB
             results = self.collection.query(
-                query_embeddings=query_embedding,
+                query_embeddings=query_embedding[None],
                 n_results=top_k,
                 include=["documents", "metadatas", "distances"]
             )
@@ -155,37 +310,11 @@ class KnowledgeBase:
     
     def document_exists(self, doc_hash: str) -> bool:
         """Check if a document already exists in the knowledge base."""
-        try:
-            results = self.collection.get(
-                where={"doc_hash": doc_hash},
-                limit=1
-            )
-            return len(results['ids']) > 0
-        except:
-            return False
+        return doc_hash in self._documents
     
     def get_all_documents(self) -> List[Dict[str, Any]]:
         """Get all documents in the knowledge base."""
-        try:
-            results = self.collection.get(include=["metadatas"])
-            
-            # Group by document (doc_hash) to avoid duplicates from chunks
-            docs_dict = {}
-            for metadata in results['metadatas']:
-                doc_hash = metadata['doc_hash']
-                if doc_hash not in docs_dict:
-                    docs_dict[doc_hash] = {
-                        'filename': metadata['filename'],
-                        'file_type': metadata['file_type'],
-                        'doc_hash': doc_hash,
-                        'total_chunks': metadata.get('total_chunks', 1)
-                    }
-            
-            return list(docs_dict.values())
-            
-        except Exception as e:
-            st.error(f"Error retrieving documents: {str(e)}")
-            return []
+        return [dict(document) for document in self._documents.values()]
     
     def delete_document(self, doc_hash: str) -> bool:
         """Delete a document and all its chunks from the knowledge base."""
@@ -202,6 +331,7 @@ class KnowledgeBase:
             
             # Delete all chunks
             self.collection.delete(where={"doc_hash": doc_hash})
+            self._documents.pop(doc_hash, None)
             
             filename = results['metadatas'][0]['filename'] if results['metadatas'] else "Unknown"
             st.success(f"Successfully deleted '{filename}' from knowledge base")
@@ -214,12 +344,11 @@ class KnowledgeBase:
     def get_stats(self) -> Dict[str, Any]:
         """Get knowledge base statistics."""
         try:
-            all_docs = self.get_all_documents()
-            total_chunks = self.collection.count()
+            all_docs = list(self._documents.values())
             
             return {
                 'total_documents': len(all_docs),
-                'total_chunks': total_chunks,
+                'total_chunks': sum(doc['total_chunks'] for doc in all_docs),
                 'file_types': list(set(doc['file_type'] for doc in all_docs))
             }
         except Exception as e:
@@ -231,6 +360,7 @@ class KnowledgeBase:
         try:
             self.client.delete_collection(self.collection_name)
             self.collection = self._get_or_create_collection()
+            self._documents = {}
             st.success("Knowledge base cleared successfully")
             return True
         except Exception as e:
@@ -1,11 +1,24 @@
 """Simplified knowledge base management with basic text search."""
 
 import os
+import re
 import json
+import math
+import threading
+import numpy as np
+from collections import Counter
 import streamlit as st
 from typing import List, Dict, Any, Optional
 from config.settings import settings
-from src.utils import chunk_text, get_file_hash
+from src.utils import chunk_text, get_file_hash, get_text_hash
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Words for search; punctuation is dropped so "score?" and "score," match "score"
+_TOKEN_RE = re.compile(r"\w+")
 
 
 class SimpleKnowledgeBase:
@@ -18,11 +31,21 @@ class SimpleKnowledgeBase:
         else:
             self.data_file = os.path.join(settings.KNOWLEDGE_BASE_DIR, "knowledge_base.json")
         self.documents = self._load_documents()
+        self._by_hash = {doc['doc_hash']: doc for doc in self.documents}
+        self._titles = {doc.get('title', doc['filename']) for doc in self.documents}
+        # Built on first search and dropped whenever the documents change
+        self._search_index = None
+        # Documents may be added from the background loader while sessions read them
+        self._lock = threading.RLock()
     
     def _load_documents(self) -> List[Dict[str, Any]]:
         """Load documents from JSON file."""
         try:
             if os.path.exists(self.data_file):
+                # orjson parses the multi-megabyte file several times faster when installed
+                if orjson is not None:
+                    with open(self.data_file, 'rb') as f:
+                        return orjson.loads(f.read())
                 with open(self.data_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
             return []
@@ -34,8 +57,12 @@ class SimpleKnowledgeBase:
         """Save documents to JSON file."""
         try:
             os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.documents, f, ensure_ascii=False, indent=2)
+            if orjson is not None:
+                with open(self.data_file, 'wb') as f:
+                    f.write(orjson.dumps(self.documents, option=orjson.OPT_INDENT_2))
+            else:
+                with open(self.data_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.documents, f, ensure_ascii=False, indent=2)
             return True
         except Exception as e:
             st.error(f"Error saving documents: {str(e)}")
@@ -43,104 +70,175 @@ class SimpleKnowledgeBase:
     
     def add_document(self, title: str = None, content: str = None, metadata: Dict[str, Any] = None, filename: str = None, file_type: str = "text") -> bool:
         """Add a document to the knowledge base."""
-        try:
-            # Handle both old and new parameter styles
-            if title and content:
-                filename = title
-            elif filename is None:
-                filename = title or "untitled"
-            
-            if not content or not content.strip():
-                st.warning("Document content is empty")
-                return False
-            
-            # Create chunks from the content
-            chunks = chunk_text(content, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
-            
-            # Generate unique ID
-            doc_hash = get_file_hash(content.encode())
-            
-            # Check if document already exists
-            if self.document_exists(doc_hash):
-                st.warning(f"Document '{filename}' already exists in the knowledge base")
-                return False
-            
-            # Add document with chunks
-            document = {
-                'title': title or filename,
-                'filename': filename,
-                'file_type': file_type,
-                'doc_hash': doc_hash,
-                'content': content,
-                'chunks': chunks,
-                'total_chunks': len(chunks),
-                'metadata': metadata or {}
-            }
-            
-            self.documents.append(document)
-            
-            if self._save_documents():
-                st.success(f"Successfully added '{filename}' to knowledge base ({len(chunks)} chunks)")
-                return True
-            else:
-                # Remove from memory if save failed
-                self.documents.pop()
-                return False
+        with self._lock:
+            try:
+                # Handle both old and new parameter styles
+                if title and content:
+                    filename = title
+                elif filename is None:
+                    filename = title or "untitled"
                 
-        except Exception as e:
-            st.error(f"Error adding document to knowledge base: {str(e)}")
-            return False
-    
+                if not content or not content.strip():
+                    st.warning("Document content is empty")
+                    return False
+                
+                # Create chunks from the content
+                chunks = chunk_text(content, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+                
+                # Generate unique ID
+                doc_hash = get_text_hash(content)
+                
+                # Check if document already exists
+                if self.document_exists(doc_hash):
+                    st.warning(f"Document '{filename}' already exists in the knowledge base")
+                    return False
+                
+                # Add document with chunks
+                document = {
+                    'title': title or filename,
+                    'filename': filename,
+                    'file_type': file_type,
+                    'doc_hash': doc_hash,
+                    'content': content,
+                    'chunks': chunks,
+                    'total_chunks': len(chunks),
+                    'metadata': metadata or {}
+                }
+                
+                self.documents.append(document)
+                self._by_hash[doc_hash] = document
+                self._titles.add(document['title'])
+                self._search_index = None
+                
+                if self._save_documents():
+                    st.success(f"Successfully added '{filename}' to knowledge base ({len(chunks)} chunks)")
+                    return True
+                else:
+                    # Remove from memory if save failed
+                    self.documents.pop()
+                    del self._by_hash[doc_hash]
+                    self._rebuild_titles()
+                    self._search_index = None
+                    return False
+                    
+            except Exception as e:
+                st.error(f"Error adding document to knowledge base: {str(e)}")
+                return False
+
+    def add_documents_batch(self, items: List[Dict[str, Any]]) -> Optional[int]:
+        """Add several documents to the knowledge base with a single save.
+
+        Each item is a dict with 'title', 'content' and optional 'metadata' and
+        'file_type' keys. Returns the number of documents added, 0 when all were
+        empty or already stored, or None if saving failed.
+        """
+        with self._lock:
+            try:
+                added = []
+                seen_hashes = set(self._by_hash)
+
+                for item in items:
+                    title = item.get('title') or "untitled"
+                    content = item.get('content')
+
+                    if not content or not content.strip():
+                        continue
+
+                    # Skip documents already stored or repeated within this batch
+                    doc_hash = get_text_hash(content)
+                    if doc_hash in seen_hashes:
+                        continue
+                    seen_hashes.add(doc_hash)
+
+                    chunks = chunk_text(content, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+                    added.append({
+                        'title': title,
+                        'filename': title,
+                        'file_type': item.get('file_type', "text"),
+                        'doc_hash': doc_hash,
+                        'content': content,
+                        'chunks': chunks,
+                        'total_chunks': len(chunks),
+                        'metadata': item.get('metadata') or {}
+                    })
+
+                if not added:
+                    return 0
+
+                self.documents.extend(added)
+                self._by_hash.update((doc['doc_hash'], doc) for doc in added)
+                self._titles.update(doc['title'] for doc in added)
+                self._search_index = None
+
+                if self._save_documents():
+                    total_chunks = sum(doc['total_chunks'] for doc in added)
+                    st.success(f"Successfully added {len(added)} documents to knowledge base ({total_chunks} chunks)")
+                    return len(added)
+                else:
+                    # Remove from memory if save failed
+                    del self.documents[-len(added):]
+                    for doc in added:
+                        del self._by_hash[doc['doc_hash']]
+                    self._rebuild_titles()
+                    self._search_index = None
+                    return None
+
+            except Exception as e:
+                st.error(f"Error adding documents to knowledge base: {str(e)}")
+                return None
+
     def search(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Search for relevant documents based on the query using simple text matching."""
+        """Search for relevant documents based on the query."""
         return self.search_documents(query, top_k)
     
     def search_documents(self, query: str, top_k: int = None) -> List[Dict[str, Any]]:
-        """Search for relevant documents based on the query using simple text matching."""
+        """Search for relevant documents based on the query using BM25 ranking."""
         try:
             if top_k is None:
                 top_k = settings.TOP_K_RESULTS
             
-            query_lower = query.lower()
-            query_words = set(query_lower.split())
+            query_words = set(_TOKEN_RE.findall(query.lower()))
+            index = self._get_search_index()
             
-            # Score each chunk based on word overlap
-            scored_chunks = []
+            # Accumulate BM25 scores from the posting lists of the query words only,
+            # one array operation per word
+            k1 = settings.BM25_K1
+            length_norms = index['length_norms']
+            scores = np.zeros(len(length_norms))
+            for word in query_words:
+                postings = index['postings'].get(word)
+                if postings is None:
+                    continue
+                chunk_ids, tfs = postings
+                # A chunk appears at most once per posting list, so plain fancy-index add is safe
+                scores[chunk_ids] += index['idf'][word] * tfs * (k1 + 1) / (tfs + k1 * length_norms[chunk_ids])
             
-            for doc in self.documents:
-                for i, chunk in enumerate(doc['chunks']):
-                    chunk_lower = chunk.lower()
-                    chunk_words = set(chunk_lower.split())
-                    
-                    # Calculate simple relevance score
-                    # Count exact query appearances
-                    exact_matches = chunk_lower.count(query_lower)
-                    
-                    # Count word overlaps
-                    word_overlap = len(query_words.intersection(chunk_words))
-                    
-                    # Calculate score (prioritize exact matches)
-                    score = exact_matches * 3 + word_overlap
-                    
-                    if score > 0:
-                        scored_chunks.append({
-                            'content': chunk,
-                            'title': doc.get('title', doc['filename']),
-                            'filename': doc['filename'],
-                            'file_type': doc['file_type'],
-                            'similarity': min(score / (len(query_words) + 3), 1.0),  # Normalize to 0-1
-                            'chunk_index': i,
-                            'score': score
-                        })
+            matched = np.flatnonzero(scores)
+            if not len(matched):
+                return []
             
-            # Sort by score and return top results
-            scored_chunks.sort(key=lambda x: x['score'], reverse=True)
+            # Highest scores first; the stable sort keeps document order for ties
+            top_chunks = matched[np.argsort(-scores[matched], kind='stable')[:top_k]]
+            best_score = scores[top_chunks[0]]
             
-            # Filter by similarity threshold and return top_k
             results = []
-            for chunk in scored_chunks[:top_k]:
-                if chunk['similarity'] >= settings.SIMILARITY_THRESHOLD / 2:  # Lower threshold for text search
-                    results.append(chunk)
+            for chunk_id in top_chunks.tolist():
+                score = float(scores[chunk_id])
+                # Similarity relative to the best match, filtered like the other search paths
+                similarity = float(score / best_score)
+                if similarity < settings.SIMILARITY_THRESHOLD / 2:  # Lower threshold for text search
+                    continue
+                
+                doc, i = index['chunks'][chunk_id]
+                results.append({
+                    'content': doc['chunks'][i],
+                    'title': doc.get('title', doc['filename']),
+                    'filename': doc['filename'],
+                    'file_type': doc['file_type'],
+                    'similarity': similarity,
+                    'chunk_index': i,
+                    'score': score
+                })
             
             return results
             
@@ -148,14 +246,67 @@ class SimpleKnowledgeBase:
             st.error(f"Error searching documents: {str(e)}")
             return []
     
+    def build_search_index(self) -> None:
+        """Build the search index ahead of the first search."""
+        self._get_search_index()
+    
+    def _get_search_index(self) -> Dict[str, Any]:
+        """Get the BM25 inverted index over all chunks, building it if the documents changed."""
+        with self._lock:
+            if self._search_index is None:
+                chunks = []
+                postings = {}
+                lengths = []
+                for doc in self.documents:
+                    for i, chunk in enumerate(doc['chunks']):
+                        words = _TOKEN_RE.findall(chunk.lower())
+                        for word, tf in Counter(words).items():
+                            chunk_ids, tfs = postings.setdefault(word, ([], []))
+                            chunk_ids.append(len(chunks))
+                            tfs.append(tf)
+                        chunks.append((doc, i))
+                        lengths.append(len(words))
+                
+                # Per-word IDF and per-chunk length normalization don't depend on the query
+                n_chunks = len(chunks)
+                avg_length = (sum(lengths) / n_chunks if n_chunks else 0.0) or 1.0
+                b = settings.BM25_B
+                
+                # Posting lists as parallel arrays so a query scores each word in one vectorized step
+                self._search_index = {
+                    'chunks': chunks,
+                    'postings': {
+                        word: (np.array(chunk_ids, dtype=np.int32), np.array(tfs, dtype=np.float64))
+                        for word, (chunk_ids, tfs) in postings.items()
+                    },
+                    'idf': {
+                        word: math.log((n_chunks - len(chunk_ids) + 0.5) / (len(chunk_ids) + 0.5) + 1)
+                        for word, (chunk_ids, _) in postings.items()
+                    },
+                    'length_norms': 1 - b + b * np.array(lengths, dtype=np.float64) / avg_length
+                }
+            return self._search_index
+    
     def list_documents(self) -> List[Dict[str, Any]]:
         """List all documents in the knowledge base."""
         return self.get_all_documents()
     
+    def has_document(self, title: str) -> bool:
+        """Check if a document with the given title is in the knowledge base."""
+        return title in self._titles
+    
+    def _rebuild_titles(self) -> None:
+        """Recompute the title index after documents are removed."""
+        self._titles = {doc.get('title', doc['filename']) for doc in self.documents}
+    
     def document_exists(self, doc_hash: str) -> bool:
         """Check if a document already exists in the knowledge base."""
-        return any(doc['doc_hash'] == doc_hash for doc in self.documents)
+        return doc_hash in self._by_hash
     
+    def get_fingerprint(self) -> str:
+        """Get a hash identifying the current set of documents in the knowledge base."""
+        return get_file_hash("".join(doc['doc_hash'] for doc in self.documents).encode())
+
     def get_all_documents(self) -> List[Dict[str, Any]]:
         """Get all documents in the knowledge base."""
         try:
@@ -173,25 +324,31 @@ class SimpleKnowledgeBase:
     
     def delete_document(self, doc_hash: str) -> bool:
         """Delete a document from the knowledge base."""
-        try:
-            original_length = len(self.documents)
-            self.documents = [doc for doc in self.documents if doc['doc_hash'] != doc_hash]
-            
-            if len(self.documents) < original_length:
-                if self._save_documents():
-                    st.success("Document deleted successfully")
-                    return True
+        with self._lock:
+            try:
+                document = self._by_hash.pop(doc_hash, None)
+                
+                if document is not None:
+                    self.documents.remove(document)
+                    self._rebuild_titles()
+                    self._search_index = None
+                    if self._save_documents():
+                        st.success("Document deleted successfully")
+                        return True
+                    else:
+                        # Restore documents if save failed
+                        self.documents = self._load_documents()
+                        self._by_hash = {doc['doc_hash']: doc for doc in self.documents}
+                        self._rebuild_titles()
+                        self._search_index = None
+                        return False
                 else:
-                    # Restore documents if save failed
-                    self.documents = self._load_documents()
+                    st.warning("Document not found")
                     return False
-            else:
-                st.warning("Document not found")
+                    
+            except Exception as e:
+                st.error(f"Error deleting document: {str(e)}")
                 return False
-                
-        except Exception as e:
-            st.error(f"Error deleting document: {str(e)}")
-            return False
     
     def get_stats(self) -> Dict[str, Any]:
         """Get knowledge base statistics."""
@@ -210,18 +367,28 @@ class SimpleKnowledgeBase:
     
     def clear_all(self) -> bool:
         """Clear all documents from the knowledge base."""
-        try:
-            self.documents = []
-            if self._save_documents():
-                st.success("Knowledge base cleared successfully")
-                return True
-            return False
-        except Exception as e:
-            st.error(f"Error clearing knowledge base: {str(e)}")
-            return False
+        with self._lock:
+            try:
+                self.documents = []
+                self._by_hash = {}
+                self._titles = set()
+                self._search_index = None
+                if self._save_documents():
+                    st.success("Knowledge base cleared successfully")
+                    return True
+                return False
+            except Exception as e:
+                st.error(f"Error clearing knowledge base: {str(e)}")
+                return False
 
 
 @st.cache_resource
 def get_simple_knowledge_base() -> SimpleKnowledgeBase:
     """Get cached knowledge base instance."""
-    return SimpleKnowledgeBase() 
\ No newline at end of file
+    return SimpleKnowledgeBase(settings.KNOWLEDGE_BASE_PATH)
+
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def search_knowledge_base(query: str, top_k: int, fingerprint: str) -> List[Dict[str, Any]]:
+    """Search the cached knowledge base, memoized per query and knowledge base fingerprint."""
+    return get_simple_knowledge_base().search(query, top_k)
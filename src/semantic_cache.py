@@ -0,0 +1,129 @@
+"""In-process cache of expert answers for repeated and near-duplicate questions."""
+
+import re
+import time
+import threading
+import numpy as np
+import streamlit as st
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config.settings import settings
+from src.utils import normalize_question
+
+
+class SemanticCache:
+    """LRU cache that serves a stored answer for a repeated question, or a close paraphrase by embedding."""
+
+    def __init__(self, max_size: int = 256, ttl: int = 3600, embedding_tau: float = 0.93):
+        """Initialize the cache."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.embedding_tau = embedding_tau
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question: str, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """Return the cached response for the same question, or None on a miss."""
+        # Only an exact match after normalization counts: word order and numbers change
+        # the answer ("IRA to 401k" vs "401k to IRA"), so paraphrases go through get_similar
+        key = (namespace, normalize_question(question))
+        now = time.time()
+
+        with self._lock:
+            if key not in self._entries:
+                return None
+            return self._hit(key, now)
+
+    def get_similar(self, question: str, embedding: Sequence[float], namespace: str = "") -> Optional[Dict[str, Any]]:
+        """Return the cached response whose question embedding is closest to the given one, or None.
+
+        Only cached questions with exactly the same numbers as the new one are considered.
+        """
+        query = self._normalize(embedding)
+        # Embeddings barely register numbers, so "I'm 25, ..." and "I'm 65, ..." can look alike
+        numbers = self._numbers(question)
+        now = time.time()
+
+        with self._lock:
+            # Drop expired entries first so an expired best match can't hide a live one
+            self._evict_expired(now)
+            candidates = [
+                (key, entry['embedding']) for key, entry in self._entries.items()
+                if key[0] == namespace and entry['embedding'] is not None
+                and self._numbers(entry['question']) == numbers
+            ]
+            if not candidates:
+                return None
+
+            # Cosine similarity against all cached questions in one matrix product
+            # on the int8 codes, rescaled by each vector's quantization step
+            codes, steps = zip(*(embedding for _, embedding in candidates))
+            similarities = (np.vstack(codes) @ query) * np.array(steps, dtype=np.float32)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.embedding_tau:
+                return None
+
+            return self._hit(candidates[best][0], now)
+
+    @staticmethod
+    def _numbers(question: str) -> List[str]:
+        """Get the numbers in a question, in order."""
+        return re.findall(r"\d+", question)
+
+    def _evict_expired(self, now: float) -> None:
+        """Remove every entry older than the TTL."""
+        expired = [key for key, entry in self._entries.items() if now - entry['ts'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def _hit(self, key: Tuple[str, str], now: float) -> Optional[Dict[str, Any]]:
+        """Return an entry's response if it has not expired, marking it recently used."""
+        entry = self._entries[key]
+        if now - entry['ts'] > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return entry['response']
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @classmethod
+    def _quantize(cls, embedding: Sequence[float]) -> Tuple[np.ndarray, float]:
+        """Convert an embedding to int8 codes of its unit vector plus the step that scales them back."""
+        vector = cls._normalize(embedding)
+        step = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / step).astype(np.int8), step
+
+    def put(self, question: str, response: Dict[str, Any], namespace: str = "",
+            embedding: Optional[Sequence[float]] = None) -> None:
+        """Store a response for the question, evicting the least recently used entry if full."""
+        key = (namespace, normalize_question(question))
+        # int8 codes take a quarter of the memory of float32 vectors
+        quantized = self._quantize(embedding) if embedding is not None else None
+
+        with self._lock:
+            self._entries[key] = {'question': question, 'response': response, 'embedding': quantized, 'ts': time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            self._entries.clear()
+
+
+@st.cache_resource
+def get_semantic_cache() -> SemanticCache:
+    """Get a cached semantic cache instance shared across sessions."""
+    return SemanticCache(
+        max_size=settings.CACHE_MAX_SIZE,
+        ttl=settings.CACHE_TTL_SECONDS,
+        embedding_tau=settings.CACHE_EMBEDDING_SIMILARITY_THRESHOLD
+    )
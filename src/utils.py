@@ -1,7 +1,10 @@
 """Utility functions for the Personal Finance Assistant app."""
 
 import os
+import re
 import hashlib
+from functools import lru_cache
+from concurrent.futures import Executor
 import streamlit as st
 from typing import List, Optional
 from io import BytesIO
@@ -27,6 +30,14 @@ def get_file_hash(content: bytes) -> str:
     return hashlib.md5(content).hexdigest()
 
 
+def get_text_hash(text: str, block_size: int = 1 << 20) -> str:
+    """Generate the same hash as get_file_hash(text.encode()) without encoding the whole text at once."""
+    hasher = hashlib.md5()
+    for i in range(0, len(text), block_size):
+        hasher.update(text[i:i + block_size].encode())
+    return hasher.hexdigest()
+
+
 def extract_text_from_file(uploaded_file) -> Optional[str]:
     """Extract text content from uploaded files."""
     try:
@@ -37,17 +48,11 @@ def extract_text_from_file(uploaded_file) -> Optional[str]:
         
         elif file_extension == '.pdf':
             pdf_reader = pypdf.PdfReader(BytesIO(uploaded_file.read()))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return "".join(page.extract_text() + "\n" for page in pdf_reader.pages)
         
         elif file_extension == '.docx':
             doc = Document(BytesIO(uploaded_file.read()))
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
         
         else:
             st.error(f"Unsupported file type: {file_extension}")
@@ -76,17 +81,11 @@ def process_document(file_path: str) -> Optional[str]:
         elif file_extension == '.pdf':
             with open(file_path, 'rb') as f:
                 pdf_reader = pypdf.PdfReader(f)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                return "".join(page.extract_text() + "\n" for page in pdf_reader.pages)
         
         elif file_extension == '.docx':
             doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
         
         else:
             print(f"Unsupported file type: {file_extension}")
@@ -97,6 +96,24 @@ def process_document(file_path: str) -> Optional[str]:
         return None
 
 
+@st.cache_data(show_spinner=False, max_entries=64, persist="disk")
+def process_document_cached(file_path: str, mtime: float, size: int, _executor: Optional[Executor] = None) -> str:
+    """Extract text from a file, cached on disk by its path, modification time and size.
+    
+    On a cache miss the extraction runs on _executor when one is given, e.g. a
+    process pool so CPU-bound PDF parsing is not serialized by the GIL.
+    Raises ValueError if extraction fails, so the failure is not cached and
+    the file is extracted again next time.
+    """
+    if _executor is not None:
+        text = _executor.submit(process_document, file_path).result()
+    else:
+        text = process_document(file_path)
+    if text is None:
+        raise ValueError(f"Could not extract text from {file_path}")
+    return text
+
+
 def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
     """Split text into overlapping chunks for better retrieval."""
     if len(text) <= chunk_size:
@@ -133,32 +150,41 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
     return chunks
 
 
+FINANCE_KEYWORDS = [
+    'money', 'finance', 'financial', 'investment', 'invest', 'budget', 'budgeting',
+    'savings', 'save', 'debt', 'credit', 'loan', 'mortgage', 'retirement',
+    'pension', 'tax', 'taxes', 'income', 'expense', 'spending', 'cost',
+    'price', 'stock', 'stocks', 'bond', 'bonds', 'portfolio', 'asset',
+    'liability', 'equity', 'fund', 'funds', 'account', 'bank', 'banking',
+    'insurance', 'risk', 'return', 'profit', 'loss', 'dividend', 'interest',
+    'rate', 'apr', 'apy', 'compound', 'simple', 'principal', 'balance',
+    'payment', 'pay', 'owe', 'owing', 'afford', 'emergency', 'goal',
+    'wealth', 'rich', 'poor', '401k', 'ira', 'roth', 'traditional',
+    # Career and income related
+    'salary', 'wage', 'wages', 'negotiate', 'negotiation', 'raise', 'promotion',
+    'compensation', 'paycheck', 'bonus', 'benefits', 'career', 'job', 'work',
+    'employment', 'employer', 'employee', 'freelance', 'contractor', 'hourly',
+    # Real estate and major purchases
+    'house', 'home', 'rent', 'renting', 'buying', 'selling', 'property',
+    'realtor', 'downpayment', 'closing', 'refinance', 'equity',
+    # Additional finance terms
+    'networth', 'cashflow', 'frugal', 'cheap', 'expensive', 'value',
+    'worth', 'cost', 'price', 'deal', 'bargain', 'discount', 'sale'
+]
+
+# Keywords match anywhere in the question (e.g. 'invest' also matches 'investing')
+_FINANCE_RE = re.compile("|".join(re.escape(keyword) for keyword in dict.fromkeys(FINANCE_KEYWORDS)), re.IGNORECASE)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase a question and collapse its whitespace for validation, search and cache keys."""
+    return " ".join(question.lower().split())
+
+
+@lru_cache(maxsize=1024)
 def validate_finance_question(question: str) -> bool:
     """Basic validation to check if question is finance-related."""
-    finance_keywords = [
-        'money', 'finance', 'financial', 'investment', 'invest', 'budget', 'budgeting',
-        'savings', 'save', 'debt', 'credit', 'loan', 'mortgage', 'retirement',
-        'pension', 'tax', 'taxes', 'income', 'expense', 'spending', 'cost',
-        'price', 'stock', 'stocks', 'bond', 'bonds', 'portfolio', 'asset',
-        'liability', 'equity', 'fund', 'funds', 'account', 'bank', 'banking',
-        'insurance', 'risk', 'return', 'profit', 'loss', 'dividend', 'interest',
-        'rate', 'apr', 'apy', 'compound', 'simple', 'principal', 'balance',
-        'payment', 'pay', 'owe', 'owing', 'afford', 'emergency', 'goal',
-        'wealth', 'rich', 'poor', '401k', 'ira', 'roth', 'traditional',
-        # Career and income related
-        'salary', 'wage', 'wages', 'negotiate', 'negotiation', 'raise', 'promotion',
-        'compensation', 'paycheck', 'bonus', 'benefits', 'career', 'job', 'work',
-        'employment', 'employer', 'employee', 'freelance', 'contractor', 'hourly',
-        # Real estate and major purchases
-        'house', 'home', 'rent', 'renting', 'buying', 'selling', 'property',
-        'realtor', 'downpayment', 'closing', 'refinance', 'equity',
-        # Additional finance terms
-        'networth', 'cashflow', 'frugal', 'cheap', 'expensive', 'value',
-        'worth', 'cost', 'price', 'deal', 'bargain', 'discount', 'sale'
-    ]
-    
-    question_lower = question.lower()
-    return any(keyword in question_lower for keyword in finance_keywords)
+    return _FINANCE_RE.search(question) is not None
 
 
 def format_response(response: str) -> str: